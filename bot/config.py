@@ -29,11 +29,14 @@ class Settings:
     openrouter_models: tuple[str, ...]
     openrouter_request_timeout_sec: int
     openrouter_max_model_attempts: int
+    openrouter_parallel_fanout: int
     database_url: str
     auto_topic_images_enabled: bool
     auto_topic_images_max_count: int
     pexels_api_key: str
     pexels_request_timeout_sec: int
+    voice_transcription_concurrency: int
+    pdf_page_cache_dir: Path
 
 
 def _parse_int(name: str, default: int) -> int:
@@ -81,6 +84,13 @@ def _build_database_url() -> str:
     return f"sqlite+aiosqlite:///{db_path.resolve().as_posix()}"
 
 
+def _resolve_project_path(name: str, default: str) -> Path:
+    path = Path(os.getenv(name, default).strip() or default)
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    return path.resolve()
+
+
 @lru_cache(maxsize=1)
 def load_settings() -> Settings:
     load_dotenv(ENV_PATH)
@@ -100,9 +110,12 @@ def load_settings() -> Settings:
         openrouter_models=_parse_models(),
         openrouter_request_timeout_sec=max(10, _parse_int("OPENROUTER_TIMEOUT_SEC", 40)),
         openrouter_max_model_attempts=max(1, _parse_int("OPENROUTER_MAX_MODEL_ATTEMPTS", 2)),
+        openrouter_parallel_fanout=max(1, _parse_int("OPENROUTER_PARALLEL_FANOUT", 2)),
         database_url=_build_database_url(),
         auto_topic_images_enabled=_parse_bool("AUTO_TOPIC_IMAGES_ENABLED", True),
         auto_topic_images_max_count=max(1, _parse_int("AUTO_TOPIC_IMAGES_MAX_COUNT", 20)),
         pexels_api_key=os.getenv("PEXELS_API_KEY", "").strip(),
         pexels_request_timeout_sec=max(5, _parse_int("PEXELS_TIMEOUT_SEC", 15)),
+        voice_transcription_concurrency=max(1, _parse_int("VOICE_TRANSCRIPTION_CONCURRENCY", 4)),
+        pdf_page_cache_dir=_resolve_project_path("PDF_PAGE_CACHE_DIR", ".cache/pdf_pages"),
     )
@@ -1,6 +1,12 @@
 ﻿from __future__ import annotations
 
 LANGS = ("ru", "en", "uz")
+# English names of the UI languages, used when asking the model to answer in one of them.
+LANGUAGE_NAMES = {
+    "ru": "Russian",
+    "en": "English",
+    "uz": "Uzbek",
+}
 
 LABELS = {
     "create_presentation": {"ru": "Создать презентацию", "en": "Create presentation", "uz": "Taqdimot yaratish"},
@@ -15,6 +15,7 @@ from bot.config import load_settings
 from bot.db import init_db
 from bot.handlers import setup_routers
 from bot.middlewares import ActivityLoggerMiddleware, RateLimitMiddleware
+from bot.services.openrouter_client import close_openrouter_clients, warmup_openrouter_client
 
 
 async def _start_healthcheck_server() -> asyncio.base_events.Server | None:
@@ -73,13 +74,17 @@ async def main() -> None:
     dp.message.outer_middleware(ActivityLoggerMiddleware())
     dp.include_router(setup_routers())
     health_server = await _start_healthcheck_server()
+    # Runs alongside polling startup rather than delaying it.
+    warmup_task = asyncio.create_task(warmup_openrouter_client())
 
     try:
         await dp.start_polling(bot)
     finally:
+        warmup_task.cancel()
         if health_server is not None:
             health_server.close()
             await health_server.wait_closed()
+        await close_openrouter_clients()
         await bot.session.close()
 
 
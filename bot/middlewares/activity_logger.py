@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from collections.abc import Awaitable, Callable
 from typing import Any
 
@@ -33,13 +34,18 @@ def _extract_message_payload(message: Message) -> tuple[str, str]:
     return "other", "[unsupported]"
 
 
-def _safe_model_dump_json(value: object) -> str:
+_USER_JSON_FIELDS = ("id", "is_bot", "first_name", "last_name", "username", "language_code", "is_premium")
+_CHAT_JSON_FIELDS = ("id", "type", "title", "username", "first_name", "last_name")
+
+
+def _compact_json(value: object, fields: tuple[str, ...]) -> str:
     if value is None:
         return ""
-    try:
-        return str(value.model_dump_json(exclude_none=False))  # type: ignore[attr-defined]
-    except Exception:
-        return ""
+    return json.dumps(
+        {name: getattr(value, name, None) for name in fields},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
 
 
 class ActivityLoggerMiddleware(BaseMiddleware):
@@ -49,52 +55,59 @@ class ActivityLoggerMiddleware(BaseMiddleware):
         event: Message,
         data: dict[str, Any],
     ) -> Any:
-        if isinstance(event, Message) and event.from_user is not None:
+        if not isinstance(event, Message) or event.from_user is None:
+            return await handler(event, data)
+
+        user = event.from_user
+        # FSMContextMiddleware already put the state in data["raw_state"].
+        if "raw_state" in data:
+            state_name = str(data["raw_state"] or "")
+        else:
             state_name = ""
             state = data.get("state")
             if isinstance(state, FSMContext):
                 state_name = str(await state.get_state() or "")
 
-            message_type, payload = _extract_message_payload(event)
-            raw_user_json = _safe_model_dump_json(event.from_user)
-            raw_chat_json = _safe_model_dump_json(event.chat)
-
-            await upsert_user_profile(
-                user_id=event.from_user.id,
-                chat_id=event.chat.id if event.chat is not None else 0,
-                username=event.from_user.username or "",
-                first_name=event.from_user.first_name or "",
-                last_name=event.from_user.last_name or "",
-                full_name=event.from_user.full_name or "",
-                language_code=event.from_user.language_code or "",
-                is_bot=bool(event.from_user.is_bot),
-                is_premium=event.from_user.is_premium,
-                added_to_attachment_menu=event.from_user.added_to_attachment_menu,
-                can_join_groups=event.from_user.can_join_groups,
-                can_read_all_group_messages=event.from_user.can_read_all_group_messages,
-                supports_inline_queries=event.from_user.supports_inline_queries,
-                can_connect_to_business=event.from_user.can_connect_to_business,
-                has_main_web_app=event.from_user.has_main_web_app,
-                last_message_type=message_type,
-                last_message_text=payload,
-                state_name=state_name,
-                raw_user_json=raw_user_json,
-                raw_chat_json=raw_chat_json,
-            )
-
-            await log_user_event(
-                user_id=event.from_user.id,
-                username=event.from_user.username or "",
-                full_name=event.from_user.full_name or "",
-                message_type=message_type,
-                message_text=payload,
-                state_name=state_name,
-            )
-            if event.from_user.id != settings.admin_id:
-                ban = await get_user_ban(event.from_user.id)
-                if ban is not None:
-                    reason = ban.reason or "No reason"
-                    _, lang = await get_user_data(event.from_user.id, settings.default_tokens)
-                    await event.answer(t(lang, "banned_notice", reason=reason))
-                    return None
+        message_type, payload = _extract_message_payload(event)
+        raw_user_json = _compact_json(user, _USER_JSON_FIELDS)
+        raw_chat_json = _compact_json(event.chat, _CHAT_JSON_FIELDS)
+
+        await upsert_user_profile(
+            user_id=user.id,
+            chat_id=event.chat.id if event.chat is not None else 0,
+            username=user.username or "",
+            first_name=user.first_name or "",
+            last_name=user.last_name or "",
+            full_name=user.full_name or "",
+            language_code=user.language_code or "",
+            is_bot=bool(user.is_bot),
+            is_premium=user.is_premium,
+            added_to_attachment_menu=user.added_to_attachment_menu,
+            can_join_groups=user.can_join_groups,
+            can_read_all_group_messages=user.can_read_all_group_messages,
+            supports_inline_queries=user.supports_inline_queries,
+            can_connect_to_business=user.can_connect_to_business,
+            has_main_web_app=user.has_main_web_app,
+            last_message_type=message_type,
+            last_message_text=payload,
+            state_name=state_name,
+            raw_user_json=raw_user_json,
+            raw_chat_json=raw_chat_json,
+        )
+
+        await log_user_event(
+            user_id=user.id,
+            username=user.username or "",
+            full_name=user.full_name or "",
+            message_type=message_type,
+            message_text=payload,
+            state_name=state_name,
+        )
+        if user.id != settings.admin_id:
+            ban = await get_user_ban(user.id)
+            if ban is not None:
+                reason = ban.reason or "No reason"
+                _, lang = await get_user_data(user.id, settings.default_tokens)
+                await event.answer(t(lang, "banned_notice", reason=reason))
+                return None
         return await handler(event, data)
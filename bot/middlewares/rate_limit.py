@@ -21,10 +21,13 @@ class RateLimitMiddleware(BaseMiddleware):
 
     def _is_allowed(self, user_id: int) -> bool:
         now = time.monotonic()
-        queue = self._hits.setdefault(user_id, deque())
+        queue = self._hits.get(user_id)
+        if queue is None:
+            queue = self._hits[user_id] = deque()
         border = now - self.window_sec
+        popleft = queue.popleft
         while queue and queue[0] < border:
-            queue.popleft()
+            popleft()
         if len(queue) >= self.max_messages:
             return False
         queue.append(now)
@@ -1,16 +1,26 @@
 ﻿from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
+import os
 import random
 import re
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable, TypeVar
 
-from openai import AsyncOpenAI
+import orjson
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
 
 from bot.config import load_settings
+from bot.i18n import LANGUAGE_NAMES
+from bot.services.openrouter_client import get_openrouter_client
+
+_T = TypeVar("_T")
 
 logger = logging.getLogger(__name__)
 settings = load_settings()
@@ -20,11 +30,6 @@ READY_ASSETS_DIR = Path(__file__).resolve().parents[2] / "ready_assets_store"
 BLUE_PLAYFUL_PDF_PATH = READY_ASSETS_DIR / "Blue_Playful_Project_Presentation_Presentation_20260220_215206_0000.pdf"
 BLUE_PLAYFUL_TEMPLATE_ID = 1000
 PDF_TEMPLATE_ID_START = BLUE_PLAYFUL_TEMPLATE_ID + 1
-LANGUAGE_NAMES = {
-    "ru": "Russian",
-    "en": "English",
-    "uz": "Uzbek",
-}
 
 SLIDE_MODE_RULES = {
     "intro": "Set context, relevance, scope, and what the audience will get.",
@@ -37,19 +42,59 @@ SLIDE_MODE_RULES = {
     "risks": "Highlight risks, constraints, failure points, and mitigation actions.",
     "conclusion": "Summarize key takeaways, strategic priorities, and next steps.",
 }
+
+_SYSTEM_PROMPT = (
+    "You are a senior presentation copywriter and analyst. "
+    "Write complete, concrete, decision-useful content: reasoning, implications, and practical actions.\n\n"
+    "Reply with JSON only, no markdown or code fences, in this shape:\n"
+    '{"slides": [{"title": "Clear title", "bullets": ["point 1", "point 2", "point 3", "point 4"]}]}\n\n'
+    "Rules:\n"
+    "- Exactly the requested slide count; follow the per-slide style plan by slide index.\n"
+    "- 3-4 bullets per slide, each one complete sentence of about 80-180 characters.\n"
+    "- Slide 1: engaging opening on the topic and why it matters now. Last slide: conclusions and next steps. "
+    "Middle slides: key ideas with reasons, specific examples, and practical application.\n"
+    "- Clear, grammatical, lively and human; no redundancy, one-liners, generic or textbook statements.\n"
+    "- Prefer concrete facts, metrics, examples, and actionable tips over abstract wording.\n"
+    "- Every slide unique and easy to read, not crowded.\n"
+    "- If source material is given, it is the only factual basis; never invent facts missing from it."
+)
+
+_MIDDLE_MODES = ("facts", "deep", "interesting", "comparison", "case", "actions", "risks")
+_RNG = random.SystemRandom()
+_WS_RE = re.compile(r"\s+")
+_IMAGE_ASSET_SUFFIXES = (".png", ".jpg", ".jpeg")
+_BULLET_PREFIX_CHARS = "-*0123456789.) "
+
 MAX_TITLE_CHARS = 86
 MAX_BULLET_CHARS = 205
 MAX_BULLETS_PER_SLIDE = 4
-
-
-@dataclass
+MODEL_HEDGE_DELAY_SEC = 8.0
+SLIDE_CACHE_MAX_ENTRIES = 128
+MAX_SOURCE_MATERIAL_CHARS = 12000
+OPENROUTER_MAX_RETRIES = 2
+OPENROUTER_RETRY_BUDGET_SEC = 15.0
+MAX_CONCURRENT_OPENROUTER_REQUESTS = 16
+OFFLOAD_PARSE_CHARS = 50_000
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch a single type.
+_json_loads = orjson.loads
+
+_client: AsyncOpenAI | None = None
+_request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_OPENROUTER_REQUESTS)
+_slide_cache: OrderedDict[str, tuple[SlideContent, ...]] = OrderedDict()
+_inflight_generations: dict[str, asyncio.Task[list[SlideContent]]] = {}
+# Callers still awaiting each in-flight generation; the last one to give up cancels it.
+_inflight_waiters: dict[asyncio.Task[list[SlideContent]], int] = {}
+
+
+@dataclass(slots=True, frozen=True)
 class SlideContent:
     title: str
-    bullets: list[str]
+    bullets: tuple[str, ...]
 
 
 def _truncate_neatly(value: str, limit: int) -> str:
-    cleaned = re.sub(r"\s+", " ", value).strip()
+    cleaned = _WS_RE.sub(" ", value).strip()
     if len(cleaned) <= limit:
         return cleaned
     shortened = cleaned[:limit].rstrip()
@@ -58,25 +103,30 @@ def _truncate_neatly(value: str, limit: int) -> str:
     return shortened.rstrip(" ,.;:") + "..."
 
 
+def _collapse_ws_cap(value: str, cap: int) -> str:
+    window = cap * 2
+    while True:
+        collapsed = " ".join(value[:window].split())
+        if len(collapsed) >= cap or window >= len(value):
+            return collapsed[:cap]
+        window *= 2
+
+
 def _sanitize_slide_content(slide: SlideContent, lang: str) -> SlideContent:
     title = _truncate_neatly(slide.title, MAX_TITLE_CHARS) or (
         "Untitled" if lang == "en" else "Nomsiz" if lang == "uz" else "Без названия"
     )
 
-    bullets: list[str] = []
-    seen: set[str] = set()
+    unique: dict[str, str] = {}
     for raw in slide.bullets:
-        bullet = re.sub(r"^[\-\*\d\.\)\s]+", "", str(raw).strip())
+        bullet = " ".join(str(raw).split()).lstrip(_BULLET_PREFIX_CHARS)
         bullet = _truncate_neatly(bullet, MAX_BULLET_CHARS)
         if len(bullet) < 20:
             continue
-        key = bullet.casefold()
-        if key in seen:
-            continue
-        seen.add(key)
-        bullets.append(bullet)
-        if len(bullets) >= MAX_BULLETS_PER_SLIDE:
+        unique.setdefault(bullet.lower(), bullet)
+        if len(unique) >= MAX_BULLETS_PER_SLIDE:
             break
+    bullets = list(unique.values())
 
     if not bullets:
         bullets = (
@@ -87,98 +137,172 @@ def _sanitize_slide_content(slide: SlideContent, lang: str) -> SlideContent:
             else ["Главная практическая мысль этого слайда."]
         )
 
-    return SlideContent(title=title, bullets=bullets)
+    return SlideContent(title=title, bullets=tuple(bullets))
 
 
-def list_presentation_types() -> list[int]:
-    numbers: set[int] = set()
-    if ASSETS_DIR.exists():
-        for file_path in ASSETS_DIR.iterdir():
-            if not file_path.is_file():
-                continue
-            match = re.match(r"^(\d+)", file_path.stem)
-            if match:
-                numbers.add(int(match.group(1)))
-    numbers.update(_pdf_templates_map().keys())
-    return sorted(numbers)
+def _dir_mtime_ns(path: Path) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
 
-def _pdf_templates_map() -> dict[int, Path]:
+@lru_cache(maxsize=1)
+def _load_asset_index(mtime_ns: int) -> dict[int, Path]:
     mapping: dict[int, Path] = {}
-    if not READY_ASSETS_DIR.exists():
-        return mapping
+    with os.scandir(ASSETS_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if not entry.name.lower().endswith(_IMAGE_ASSET_SUFFIXES):
+                continue
+            stem = entry.name.rpartition(".")[0]
+            digits = len(stem) - len(stem.lstrip("0123456789"))
+            if digits:
+                mapping.setdefault(int(stem[:digits]), Path(entry.path))
+    return mapping
 
+
+@lru_cache(maxsize=1)
+def _load_pdf_templates_index(mtime_ns: int) -> dict[int, Path]:
+    mapping: dict[int, Path] = {}
     if BLUE_PLAYFUL_PDF_PATH.exists():
         mapping[BLUE_PLAYFUL_TEMPLATE_ID] = BLUE_PLAYFUL_PDF_PATH
 
-    remaining = sorted(
-        (
-            path
-            for path in READY_ASSETS_DIR.glob("*.pdf")
-            if path.is_file() and path.resolve() != BLUE_PLAYFUL_PDF_PATH.resolve()
-        ),
-        key=lambda p: p.name.casefold(),
-    )
+    with os.scandir(READY_ASSETS_DIR) as entries:
+        remaining = sorted(
+            (
+                entry.name
+                for entry in entries
+                if entry.name.endswith(".pdf")
+                and not entry.name.startswith(".")
+                and entry.name != BLUE_PLAYFUL_PDF_PATH.name
+                and entry.is_file()
+            ),
+            key=str.casefold,
+        )
 
-    template_id = PDF_TEMPLATE_ID_START
-    for path in remaining:
-        mapping[template_id] = path
-        template_id += 1
+    for template_id, name in enumerate(remaining, start=PDF_TEMPLATE_ID_START):
+        mapping[template_id] = READY_ASSETS_DIR / name
     return mapping
 
 
+@lru_cache(maxsize=1)
+def _load_presentation_types(assets_mtime_ns: int | None, pdf_mtime_ns: int | None) -> tuple[int, ...]:
+    numbers: set[int] = set()
+    if assets_mtime_ns is not None:
+        numbers.update(_load_asset_index(assets_mtime_ns))
+    if pdf_mtime_ns is not None:
+        numbers.update(_load_pdf_templates_index(pdf_mtime_ns))
+    return tuple(sorted(numbers))
+
+
+def _get_asset_map() -> dict[int, Path]:
+    mtime_ns = _dir_mtime_ns(ASSETS_DIR)
+    return _load_asset_index(mtime_ns) if mtime_ns is not None else {}
+
+
+def _pdf_templates_map() -> dict[int, Path]:
+    mtime_ns = _dir_mtime_ns(READY_ASSETS_DIR)
+    return _load_pdf_templates_index(mtime_ns) if mtime_ns is not None else {}
+
+
+def list_presentation_types() -> list[int]:
+    return list(_load_presentation_types(_dir_mtime_ns(ASSETS_DIR), _dir_mtime_ns(READY_ASSETS_DIR)))
+
+
 def get_template_name(template_type: int) -> str:
     if template_type <= 999:
         return f"Template {template_type}"
     pdf_asset = resolve_pdf_template_asset(template_type)
     if pdf_asset is None:
         return f"Template {template_type}"
-    stem = re.sub(r"\s+", " ", pdf_asset.stem.replace("_", " ")).strip()
+    stem = _WS_RE.sub(" ", pdf_asset.stem.replace("_", " ")).strip()
     return stem[:80] if stem else f"PDF Template {template_type}"
 
 
 def resolve_template_asset(template_type: int) -> Path | None:
-    if not ASSETS_DIR.exists():
-        return None
-
-    for file_path in ASSETS_DIR.iterdir():
-        if not file_path.is_file():
-            continue
-        match = re.match(r"^(\d+)", file_path.stem)
-        if not match:
-            continue
-        if int(match.group(1)) != template_type:
-            continue
-        if file_path.suffix.lower() in {".png", ".jpg", ".jpeg"}:
-            return file_path
-    return None
+    return _get_asset_map().get(template_type)
 
 
 def resolve_pdf_template_asset(template_type: int) -> Path | None:
     return _pdf_templates_map().get(template_type)
 
 
-def _extract_json(payload: str) -> Any:
-    raw = payload.strip()
-    if raw.startswith("```"):
-        raw = re.sub(r"^```(?:json)?\s*", "", raw)
-        raw = re.sub(r"\s*```$", "", raw)
+def _is_slides_payload(data: Any) -> bool:
+    if isinstance(data, dict):
+        data = data.get("slides")
+    return isinstance(data, list) and any(isinstance(item, dict) for item in data)
+
 
+def _extract_json(payload: str) -> Any:
     try:
-        return json.loads(raw)
+        data = _json_loads(payload)
     except json.JSONDecodeError:
-        match = re.search(r"\[.*\]", raw, flags=re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
-        match = re.search(r"\{.*\}", raw, flags=re.DOTALL)
-        if match:
-            data = json.loads(match.group(0))
-            return data.get("slides", []) if isinstance(data, dict) else data
-        raise
-
+        pass
+    else:
+        if _is_slides_payload(data):
+            return data
+        raise ValueError("JSON payload holds no slides")
 
-def _normalize_language_code(lang: str | None) -> str:
-    return lang if lang in LANGUAGE_NAMES else "ru"
+    raw = payload.strip()
+    if raw.startswith("```"):
+        newline = raw.find("\n")
+        raw = raw[newline + 1 :] if newline != -1 else raw[3:].removeprefix("json")
+        if raw.endswith("```"):
+            raw = raw[:-3]
+        raw = raw.strip()
+        try:
+            data = _json_loads(raw)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if _is_slides_payload(data):
+                return data
+
+    span = _find_json_span(raw, 0)
+    while span is not None:
+        try:
+            data = _json_loads(raw[span[0] : span[1]])
+        except json.JSONDecodeError:
+            span = _find_json_span(raw, span[0] + 1)
+            continue
+        if _is_slides_payload(data):
+            return data
+        span = _find_json_span(raw, span[1])
+    raise ValueError("No slides JSON found in model output")
+
+
+def _find_json_span(text: str, start: int) -> tuple[int, int] | None:
+    while True:
+        brace = text.find("{", start)
+        bracket = text.find("[", start)
+        if brace == -1 and bracket == -1:
+            return None
+        begin = brace if bracket == -1 or (brace != -1 and brace < bracket) else bracket
+
+        depth = 0
+        in_string = False
+        escape = False
+        for index in range(begin, len(text)):
+            char = text[index]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{" or char == "[":
+                depth += 1
+            elif char == "}" or char == "]":
+                depth -= 1
+                if depth == 0:
+                    return begin, index + 1
+        # This opener never closes (e.g. a smiley in leading prose): try the next one.
+        start = begin + 1
 
 
 def _build_slide_modes(slide_count: int) -> list[str]:
@@ -187,401 +311,663 @@ def _build_slide_modes(slide_count: int) -> list[str]:
     if slide_count == 1:
         return ["intro"]
 
-    middle_modes = ["facts", "deep", "interesting", "comparison", "case", "actions", "risks"]
-    rng = random.SystemRandom()
-
     plan = ["intro"]
     middle_needed = max(0, slide_count - 2)
     middle: list[str] = []
     while len(middle) < middle_needed:
-        chunk = middle_modes[:]
-        rng.shuffle(chunk)
+        chunk = list(_MIDDLE_MODES)
+        _RNG.shuffle(chunk)
         middle.extend(chunk)
     plan.extend(middle[:middle_needed])
     plan.append("conclusion")
     return plan
 
 
+_FALLBACK_TEMPLATES: dict[tuple[str, str], tuple[str, tuple[str, ...]]] = {
+    ("en", "intro"): (
+        "{topic}: Why It Matters",
+        (
+            "Business context, strategic relevance, and why this topic requires immediate attention now.",
+            "Key questions this presentation will answer to support better decisions and alignment.",
+            "Expected outcomes and practical value for stakeholders, teams, and execution planning.",
+        ),
+    ),
+    ("en", "facts"): (
+        "{topic}: Facts and Metrics ({index})",
+        (
+            "Core facts and baseline indicators that define the current state of this topic in practice.",
+            "Quantitative signals and measurable patterns used to evaluate performance and progress.",
+            "Evidence-based observations showing where gains, losses, or bottlenecks appear most clearly.",
+        ),
+    ),
+    ("en", "deep"): (
+        "{topic}: Deep Analysis ({index})",
+        (
+            "Root causes and structural drivers that shape outcomes, risks, and long-term impact.",
+            "How key mechanisms interact in real conditions and why common assumptions may fail.",
+            "Decision implications for leadership, process design, and resource prioritization.",
+        ),
+    ),
+    ("en", "interesting"): (
+        "{topic}: Insights and Interesting Angles ({index})",
+        (
+            "A non-obvious insight that reframes the topic and reveals hidden leverage points.",
+            "A meaningful detail or pattern that usually gets ignored but affects real outcomes.",
+            "An interesting fact linked to practical interpretation rather than isolated trivia.",
+        ),
+    ),
+    ("en", "comparison"): (
+        "{topic}: Option Comparison ({index})",
+        (
+            "Comparison of viable approaches with clear strengths, weaknesses, and use conditions.",
+            "Trade-offs across cost, speed, quality, and operational complexity for each option.",
+            "Selection criteria to choose the most suitable path for your current constraints.",
+        ),
+    ),
+    ("en", "case"): (
+        "{topic}: Practical Scenario ({index})",
+        (
+            "A realistic scenario describing initial conditions, actions taken, and execution choices.",
+            "Observed results, key turning points, and what influenced the final outcome most.",
+            "Transferable lessons that can be applied with adjustments in your environment.",
+        ),
+    ),
+    ("en", "actions"): (
+        "{topic}: Implementation Plan ({index})",
+        (
+            "Step-by-step implementation path with concrete actions and sequence dependencies.",
+            "Roles, ownership, and timeline checkpoints required to keep delivery on track.",
+            "Success metrics and feedback loops to verify impact and adjust quickly.",
+        ),
+    ),
+    ("en", "risks"): (
+        "{topic}: Risks and Mitigation ({index})",
+        (
+            "Major risks and constraints that can derail results if not addressed early.",
+            "Early warning indicators that help detect failure patterns before escalation.",
+            "Mitigation actions with contingency options and accountability assignments.",
+        ),
+    ),
+    ("en", "conclusion"): (
+        "Conclusion and Next Steps",
+        (
+            "Summary of key findings and what they mean for strategy, execution, and ownership.",
+            "Priority actions to take first, with expected impact and short-term milestones.",
+            "A clear next-step roadmap with measurable outcomes and review checkpoints.",
+        ),
+    ),
+    ("uz", "intro"): (
+        "{topic}: Nima Uchun Muhim",
+        (
+            "Mavzuning biznesdagi o'rni, dolzarbligi va nega aynan hozir e'tibor talab qilishi.",
+            "Taqdimot davomida javob beriladigan asosiy savollar va qarorlar uchun yo'nalish.",
+            "Stakeholderlar uchun kutilayotgan natijalar va amaliy qiymatning aniq ko'rinishi.",
+        ),
+    ),
+    ("uz", "facts"): (
+        "{topic}: Faktlar va Ko'rsatkichlar ({index})",
+        (
+            "Joriy holatni ifodalovchi asosiy faktlar va bazaviy indikatorlar tahlili.",
+            "Natijani baholashga xizmat qiladigan raqamlar, o'lchovlar va dinamik tendensiyalar.",
+            "Eng katta o'sish yoki muammo nuqtalarini ko'rsatadigan dalillarga asoslangan xulosalar.",
+        ),
+    ),
+    ("uz", "deep"): (
+        "{topic}: Chuqur Tahlil ({index})",
+        (
+            "Natijalarni belgilovchi ildiz sabablari va tizimli omillarni batafsil sharhlash.",
+            "Asosiy mexanizmlarning o'zaro ta'siri hamda noto'g'ri taxminlar xavfini ko'rsatish.",
+            "Rahbariyat va jamoalar uchun qaror qabul qilishdagi amaliy oqibatlar.",
+        ),
+    ),
+    ("uz", "interesting"): (
+        "{topic}: Qiziqarli Insightlar ({index})",
+        (
+            "Mavzuga boshqacha qarash beradigan noan'anaviy, lekin foydali insight taqdim etish.",
+            "Ko'pincha e'tibordan chetda qoladigan, ammo natijaga kuchli ta'sir qiladigan detal.",
+            "Oddiy trivia emas, balki amaliy talqin beruvchi qiziqarli fakt va xulosa.",
+        ),
+    ),
+    ("uz", "comparison"): (
+        "{topic}: Variantlar Taqqoslovi ({index})",
+        (
+            "Mumkin bo'lgan yondashuvlarni kuchli va zaif tomonlari bilan taqqoslash.",
+            "Har bir variant bo'yicha xarajat, tezlik, sifat va murakkablikdagi trade-offlar.",
+            "Hozirgi cheklovlar ostida eng mos variantni tanlash mezonlarini berish.",
+        ),
+    ),
+    ("uz", "case"): (
+        "{topic}: Amaliy Keys ({index})",
+        (
+            "Boshlang'ich holat, qilingan harakatlar va qabul qilingan qarorlar ketma-ketligi.",
+            "Olingan natijalar, burilish nuqtalari va eng katta ta'sir qilgan omillar.",
+            "Sizning sharoitingizga moslab qo'llash mumkin bo'lgan amaliy darslar.",
+        ),
+    ),
+    ("uz", "actions"): (
+        "{topic}: Amalga Oshirish Rejasi ({index})",
+        (
+            "Bosqichma-bosqich ijro rejasi va har bir bosqich o'rtasidagi bog'liqliklar.",
+            "Mas'ullar, rollar va muddatlar bo'yicha nazorat nuqtalarini belgilash.",
+            "Natijani o'lchash KPIlari va tezkor tuzatish uchun feedback mexanizmi.",
+        ),
+    ),
+    ("uz", "risks"): (
+        "{topic}: Xatarlar va Himoya ({index})",
+        (
+            "Natijani pasaytirishi mumkin bo'lgan asosiy xatarlar va operatsion cheklovlar.",
+            "Muammoni erta aniqlash uchun signal va indikatorlarni aniq ko'rsatish.",
+            "Mitigatsiya choralari, zaxira variantlar va javobgarlik taqsimoti.",
+        ),
+    ),
+    ("uz", "conclusion"): (
+        "Xulosa va Keyingi Qadamlar",
+        (
+            "Asosiy xulosalar va ularning strategiya hamda ijroga ta'sirini umumlashtirish.",
+            "Eng ustuvor amallar, kutilayotgan ta'sir va qisqa muddatli milestonelar.",
+            "Aniq keyingi qadamlar yo'l xaritasi, KPI va qayta ko'rib chiqish nuqtalari.",
+        ),
+    ),
+    ("ru", "intro"): (
+        "{topic}: Контекст и значимость",
+        (
+            "Контекст темы, её актуальность и причины, почему ей нужно уделить внимание именно сейчас.",
+            "Ключевые вопросы презентации, которые помогут принимать более точные управленческие решения.",
+            "Ожидаемая практическая ценность и результат для команды, бизнеса и заинтересованных сторон.",
+        ),
+    ),
+    ("ru", "facts"): (
+        "{topic}: Факты и метрики ({index})",
+        (
+            "Ключевые факты и базовые показатели, которые описывают текущее состояние по теме.",
+            "Измеримые метрики и наблюдаемые тенденции, важные для оценки динамики и эффективности.",
+            "Данные и подтверждения, показывающие, где сосредоточены основные точки роста и риска.",
+        ),
+    ),
+    ("ru", "deep"): (
+        "{topic}: Глубокий разбор ({index})",
+        (
+            "Разбор первопричин и системных факторов, которые формируют результат в долгую.",
+            "Пояснение механизмов влияния и связей, из-за которых простые решения часто не срабатывают.",
+            "Практические выводы для стратегии, распределения ресурсов и приоритизации действий.",
+        ),
+    ),
+    ("ru", "interesting"): (
+        "{topic}: Инсайты и интересные детали ({index})",
+        (
+            "Неочевидный инсайт, который меняет взгляд на тему и открывает новую точку воздействия.",
+            "Интересная, но прикладная деталь, которую обычно упускают, хотя она влияет на итог.",
+            "Факт с объяснением его значения для практики, а не просто отдельная любопытная цифра.",
+        ),
+    ),
+    ("ru", "comparison"): (
+        "{topic}: Сравнение подходов ({index})",
+        (
+            "Сравнение рабочих вариантов с выделением сильных и слабых сторон каждого подхода.",
+            "Компромиссы по стоимости, скорости, качеству и сложности внедрения в реальных условиях.",
+            "Критерии выбора подхода с учетом текущих ограничений, целей и зрелости команды.",
+        ),
+    ),
+    ("ru", "case"): (
+        "{topic}: Практический кейс ({index})",
+        (
+            "Краткий сценарий из практики: исходные условия, действия команды и логика решений.",
+            "Полученные результаты, поворотные моменты и факторы, повлиявшие на итог сильнее всего.",
+            "Выводы, которые можно адаптировать и применить в вашем контексте без потери смысла.",
+        ),
+    ),
+    ("ru", "actions"): (
+        "{topic}: План внедрения ({index})",
+        (
+            "Пошаговый план реализации с понятной последовательностью действий и зависимостей.",
+            "Роли, зоны ответственности и контрольные точки по срокам для управляемого исполнения.",
+            "Метрики успеха и цикл обратной связи для корректировки курса по ходу внедрения.",
+        ),
+    ),
+    ("ru", "risks"): (
+        "{topic}: Риски и меры ({index})",
+        (
+            "Ключевые риски и ограничения, которые могут сорвать срок, качество или ожидаемый эффект.",
+            "Сигналы раннего предупреждения, позволяющие заранее увидеть проблемные сценарии.",
+            "План снижения рисков: превентивные меры, резервные варианты и ответственные роли.",
+        ),
+    ),
+    ("ru", "conclusion"): (
+        "Выводы и следующие шаги",
+        (
+            "Итоговые выводы и их значение для стратегии, операционного управления и приоритетов.",
+            "Приоритетные действия на ближайший этап с ожидаемым эффектом и контрольными точками.",
+            "Четкий roadmap следующих шагов с измеримыми результатами и периодом ревизии.",
+        ),
+    ),
+}
+
+
 def _mode_lines_for_prompt(slide_modes: list[str]) -> str:
-    lines: list[str] = []
-    for idx, mode in enumerate(slide_modes, start=1):
-        lines.append(f"- Slide {idx}: {SLIDE_MODE_RULES.get(mode, SLIDE_MODE_RULES['deep'])}")
-    return "\n".join(lines)
+    rules = SLIDE_MODE_RULES
+    return "\n".join(f"- Slide {idx}: {rules[mode]}" for idx, mode in enumerate(slide_modes, start=1))
 
 
 def _fallback_mode_slide(topic: str, index: int, mode: str, lang: str) -> SlideContent:
-    if lang == "en":
-        definitions = {
-            "intro": (
-                f"{topic}: Why It Matters",
-                [
-                    "Business context, strategic relevance, and why this topic requires immediate attention now.",
-                    "Key questions this presentation will answer to support better decisions and alignment.",
-                    "Expected outcomes and practical value for stakeholders, teams, and execution planning.",
-                ],
-            ),
-            "facts": (
-                f"{topic}: Facts and Metrics ({index})",
-                [
-                    "Core facts and baseline indicators that define the current state of this topic in practice.",
-                    "Quantitative signals and measurable patterns used to evaluate performance and progress.",
-                    "Evidence-based observations showing where gains, losses, or bottlenecks appear most clearly.",
-                ],
-            ),
-            "deep": (
-                f"{topic}: Deep Analysis ({index})",
-                [
-                    "Root causes and structural drivers that shape outcomes, risks, and long-term impact.",
-                    "How key mechanisms interact in real conditions and why common assumptions may fail.",
-                    "Decision implications for leadership, process design, and resource prioritization.",
-                ],
-            ),
-            "interesting": (
-                f"{topic}: Insights and Interesting Angles ({index})",
-                [
-                    "A non-obvious insight that reframes the topic and reveals hidden leverage points.",
-                    "A meaningful detail or pattern that usually gets ignored but affects real outcomes.",
-                    "An interesting fact linked to practical interpretation rather than isolated trivia.",
-                ],
-            ),
-            "comparison": (
-                f"{topic}: Option Comparison ({index})",
-                [
-                    "Comparison of viable approaches with clear strengths, weaknesses, and use conditions.",
-                    "Trade-offs across cost, speed, quality, and operational complexity for each option.",
-                    "Selection criteria to choose the most suitable path for your current constraints.",
-                ],
-            ),
-            "case": (
-                f"{topic}: Practical Scenario ({index})",
-                [
-                    "A realistic scenario describing initial conditions, actions taken, and execution choices.",
-                    "Observed results, key turning points, and what influenced the final outcome most.",
-                    "Transferable lessons that can be applied with adjustments in your environment.",
-                ],
-            ),
-            "actions": (
-                f"{topic}: Implementation Plan ({index})",
-                [
-                    "Step-by-step implementation path with concrete actions and sequence dependencies.",
-                    "Roles, ownership, and timeline checkpoints required to keep delivery on track.",
-                    "Success metrics and feedback loops to verify impact and adjust quickly.",
-                ],
-            ),
-            "risks": (
-                f"{topic}: Risks and Mitigation ({index})",
-                [
-                    "Major risks and constraints that can derail results if not addressed early.",
-                    "Early warning indicators that help detect failure patterns before escalation.",
-                    "Mitigation actions with contingency options and accountability assignments.",
-                ],
-            ),
-            "conclusion": (
-                "Conclusion and Next Steps",
-                [
-                    "Summary of key findings and what they mean for strategy, execution, and ownership.",
-                    "Priority actions to take first, with expected impact and short-term milestones.",
-                    "A clear next-step roadmap with measurable outcomes and review checkpoints.",
-                ],
-            ),
-        }
-    elif lang == "uz":
-        definitions = {
-            "intro": (
-                f"{topic}: Nima Uchun Muhim",
-                [
-                    "Mavzuning biznesdagi o'rni, dolzarbligi va nega aynan hozir e'tibor talab qilishi.",
-                    "Taqdimot davomida javob beriladigan asosiy savollar va qarorlar uchun yo'nalish.",
-                    "Stakeholderlar uchun kutilayotgan natijalar va amaliy qiymatning aniq ko'rinishi.",
-                ],
-            ),
-            "facts": (
-                f"{topic}: Faktlar va Ko'rsatkichlar ({index})",
-                [
-                    "Joriy holatni ifodalovchi asosiy faktlar va bazaviy indikatorlar tahlili.",
-                    "Natijani baholashga xizmat qiladigan raqamlar, o'lchovlar va dinamik tendensiyalar.",
-                    "Eng katta o'sish yoki muammo nuqtalarini ko'rsatadigan dalillarga asoslangan xulosalar.",
-                ],
-            ),
-            "deep": (
-                f"{topic}: Chuqur Tahlil ({index})",
-                [
-                    "Natijalarni belgilovchi ildiz sabablari va tizimli omillarni batafsil sharhlash.",
-                    "Asosiy mexanizmlarning o'zaro ta'siri hamda noto'g'ri taxminlar xavfini ko'rsatish.",
-                    "Rahbariyat va jamoalar uchun qaror qabul qilishdagi amaliy oqibatlar.",
-                ],
-            ),
-            "interesting": (
-                f"{topic}: Qiziqarli Insightlar ({index})",
-                [
-                    "Mavzuga boshqacha qarash beradigan noan'anaviy, lekin foydali insight taqdim etish.",
-                    "Ko'pincha e'tibordan chetda qoladigan, ammo natijaga kuchli ta'sir qiladigan detal.",
-                    "Oddiy trivia emas, balki amaliy talqin beruvchi qiziqarli fakt va xulosa.",
-                ],
-            ),
-            "comparison": (
-                f"{topic}: Variantlar Taqqoslovi ({index})",
-                [
-                    "Mumkin bo'lgan yondashuvlarni kuchli va zaif tomonlari bilan taqqoslash.",
-                    "Har bir variant bo'yicha xarajat, tezlik, sifat va murakkablikdagi trade-offlar.",
-                    "Hozirgi cheklovlar ostida eng mos variantni tanlash mezonlarini berish.",
-                ],
-            ),
-            "case": (
-                f"{topic}: Amaliy Keys ({index})",
-                [
-                    "Boshlang'ich holat, qilingan harakatlar va qabul qilingan qarorlar ketma-ketligi.",
-                    "Olingan natijalar, burilish nuqtalari va eng katta ta'sir qilgan omillar.",
-                    "Sizning sharoitingizga moslab qo'llash mumkin bo'lgan amaliy darslar.",
-                ],
-            ),
-            "actions": (
-                f"{topic}: Amalga Oshirish Rejasi ({index})",
-                [
-                    "Bosqichma-bosqich ijro rejasi va har bir bosqich o'rtasidagi bog'liqliklar.",
-                    "Mas'ullar, rollar va muddatlar bo'yicha nazorat nuqtalarini belgilash.",
-                    "Natijani o'lchash KPIlari va tezkor tuzatish uchun feedback mexanizmi.",
-                ],
-            ),
-            "risks": (
-                f"{topic}: Xatarlar va Himoya ({index})",
-                [
-                    "Natijani pasaytirishi mumkin bo'lgan asosiy xatarlar va operatsion cheklovlar.",
-                    "Muammoni erta aniqlash uchun signal va indikatorlarni aniq ko'rsatish.",
-                    "Mitigatsiya choralari, zaxira variantlar va javobgarlik taqsimoti.",
-                ],
-            ),
-            "conclusion": (
-                "Xulosa va Keyingi Qadamlar",
-                [
-                    "Asosiy xulosalar va ularning strategiya hamda ijroga ta'sirini umumlashtirish.",
-                    "Eng ustuvor amallar, kutilayotgan ta'sir va qisqa muddatli milestonelar.",
-                    "Aniq keyingi qadamlar yo'l xaritasi, KPI va qayta ko'rib chiqish nuqtalari.",
-                ],
-            ),
-        }
-    else:
-        definitions = {
-            "intro": (
-                f"{topic}: Контекст и значимость",
-                [
-                    "Контекст темы, её актуальность и причины, почему ей нужно уделить внимание именно сейчас.",
-                    "Ключевые вопросы презентации, которые помогут принимать более точные управленческие решения.",
-                    "Ожидаемая практическая ценность и результат для команды, бизнеса и заинтересованных сторон.",
-                ],
-            ),
-            "facts": (
-                f"{topic}: Факты и метрики ({index})",
-                [
-                    "Ключевые факты и базовые показатели, которые описывают текущее состояние по теме.",
-                    "Измеримые метрики и наблюдаемые тенденции, важные для оценки динамики и эффективности.",
-                    "Данные и подтверждения, показывающие, где сосредоточены основные точки роста и риска.",
-                ],
-            ),
-            "deep": (
-                f"{topic}: Глубокий разбор ({index})",
-                [
-                    "Разбор первопричин и системных факторов, которые формируют результат в долгую.",
-                    "Пояснение механизмов влияния и связей, из-за которых простые решения часто не срабатывают.",
-                    "Практические выводы для стратегии, распределения ресурсов и приоритизации действий.",
-                ],
-            ),
-            "interesting": (
-                f"{topic}: Инсайты и интересные детали ({index})",
-                [
-                    "Неочевидный инсайт, который меняет взгляд на тему и открывает новую точку воздействия.",
-                    "Интересная, но прикладная деталь, которую обычно упускают, хотя она влияет на итог.",
-                    "Факт с объяснением его значения для практики, а не просто отдельная любопытная цифра.",
-                ],
-            ),
-            "comparison": (
-                f"{topic}: Сравнение подходов ({index})",
-                [
-                    "Сравнение рабочих вариантов с выделением сильных и слабых сторон каждого подхода.",
-                    "Компромиссы по стоимости, скорости, качеству и сложности внедрения в реальных условиях.",
-                    "Критерии выбора подхода с учетом текущих ограничений, целей и зрелости команды.",
-                ],
-            ),
-            "case": (
-                f"{topic}: Практический кейс ({index})",
-                [
-                    "Краткий сценарий из практики: исходные условия, действия команды и логика решений.",
-                    "Полученные результаты, поворотные моменты и факторы, повлиявшие на итог сильнее всего.",
-                    "Выводы, которые можно адаптировать и применить в вашем контексте без потери смысла.",
-                ],
-            ),
-            "actions": (
-                f"{topic}: План внедрения ({index})",
-                [
-                    "Пошаговый план реализации с понятной последовательностью действий и зависимостей.",
-                    "Роли, зоны ответственности и контрольные точки по срокам для управляемого исполнения.",
-                    "Метрики успеха и цикл обратной связи для корректировки курса по ходу внедрения.",
-                ],
-            ),
-            "risks": (
-                f"{topic}: Риски и меры ({index})",
-                [
-                    "Ключевые риски и ограничения, которые могут сорвать срок, качество или ожидаемый эффект.",
-                    "Сигналы раннего предупреждения, позволяющие заранее увидеть проблемные сценарии.",
-                    "План снижения рисков: превентивные меры, резервные варианты и ответственные роли.",
-                ],
-            ),
-            "conclusion": (
-                "Выводы и следующие шаги",
-                [
-                    "Итоговые выводы и их значение для стратегии, операционного управления и приоритетов.",
-                    "Приоритетные действия на ближайший этап с ожидаемым эффектом и контрольными точками.",
-                    "Четкий roadmap следующих шагов с измеримыми результатами и периодом ревизии.",
-                ],
-            ),
-        }
+    template_lang = lang if lang in ("en", "uz") else "ru"
+    entry = _FALLBACK_TEMPLATES.get((template_lang, mode)) or _FALLBACK_TEMPLATES[(template_lang, "deep")]
+    title_template, bullets = entry
+    return SlideContent(title=title_template.format(topic=topic, index=index), bullets=bullets)
+
 
-    title, bullets = definitions.get(mode, definitions["deep"])
-    return SlideContent(title=title, bullets=bullets)
+@lru_cache(maxsize=512)
+def _sanitized_fallback_slide(topic: str, index: int, mode: str, lang: str) -> SlideContent:
+    return _sanitize_slide_content(_fallback_mode_slide(topic=topic, index=index, mode=mode, lang=lang), lang)
 
 
 def _fallback_slides(topic: str, slide_count: int, lang: str, slide_modes: list[str] | None = None) -> list[SlideContent]:
-    effective_modes = slide_modes if slide_modes and len(slide_modes) >= slide_count else _build_slide_modes(slide_count)
-    slides: list[SlideContent] = []
-    for i in range(1, slide_count + 1):
-        mode = effective_modes[i - 1] if i - 1 < len(effective_modes) else "deep"
-        slides.append(_sanitize_slide_content(_fallback_mode_slide(topic=topic, index=i, mode=mode, lang=lang), lang))
-    return slides
+    if slide_modes and len(slide_modes) >= slide_count:
+        effective_modes = slide_modes[:slide_count]
+    else:
+        effective_modes = _build_slide_modes(slide_count)
+    return [
+        _sanitized_fallback_slide(topic, index, mode, lang) for index, mode in enumerate(effective_modes, start=1)
+    ]
 
 
-def _normalize_slides(topic: str, slide_count: int, raw: Any, lang: str) -> list[SlideContent]:
+def _normalize_slide_item(item: Any, lang: str) -> SlideContent | None:
+    if not isinstance(item, dict):
+        return None
+    title = " ".join(str(item.get("title", "")).split())
+    bullets_raw = item.get("bullets", [])
+    if not isinstance(bullets_raw, list):
+        bullets_raw = []
+    cleaned = [" ".join(str(value).split()).lstrip(_BULLET_PREFIX_CHARS) for value in bullets_raw]
+    unique: dict[str, str] = {}
+    for bullet in cleaned:
+        if bullet:
+            unique.setdefault(bullet.lower(), bullet)
+    bullets = list(unique.values())
+    if not title and not bullets:
+        return None
+    if not bullets:
+        if lang == "en":
+            bullets = ["Main point of this slide."]
+        elif lang == "uz":
+            bullets = ["Ushbu slaydning asosiy g'oyasi."]
+        else:
+            bullets = ["Главная мысль слайда."]
+    slide = SlideContent(title=title, bullets=tuple(bullets))
+    if (
+        title
+        and len(title) <= MAX_TITLE_CHARS
+        and len(bullets) <= MAX_BULLETS_PER_SLIDE
+        and all(20 <= len(bullet) <= MAX_BULLET_CHARS for bullet in bullets)
+    ):
+        return slide
+    return _sanitize_slide_content(slide, lang)
+
+
+def _normalize_slides(
+    topic: str,
+    slide_count: int,
+    raw: Any,
+    lang: str,
+    slide_modes: list[str] | None = None,
+) -> list[SlideContent]:
     if isinstance(raw, dict):
         raw = raw.get("slides")
 
     if not isinstance(raw, list):
-        return _fallback_slides(topic, slide_count, lang)
+        raise ValueError("no_valid_slides")
 
     slides: list[SlideContent] = []
     for item in raw[:slide_count]:
-        if not isinstance(item, dict):
-            continue
-        title = str(item.get("title", "")).strip()
-        bullets_raw = item.get("bullets", [])
-        if not isinstance(bullets_raw, list):
-            bullets_raw = []
-        bullets: list[str] = []
-        seen: set[str] = set()
-        for value in bullets_raw:
-            bullet = re.sub(r"\s+", " ", str(value).strip())
-            bullet = re.sub(r"^[\-\*\d\.\)\s]+", "", bullet).strip()
-            if not bullet:
-                continue
-            key = bullet.casefold()
-            if key in seen:
-                continue
-            seen.add(key)
-            bullets.append(bullet)
-        if not bullets:
-            if lang == "en":
-                bullets = ["Main point of this slide."]
-            elif lang == "uz":
-                bullets = ["Ushbu slaydning asosiy g'oyasi."]
-            else:
-                bullets = ["Главная мысль слайда."]
-        slides.append(_sanitize_slide_content(SlideContent(title=title, bullets=bullets), lang))
+        slide = _normalize_slide_item(item, lang)
+        if slide is not None:
+            slides.append(slide)
+    # A deck made only of fallback slides must count as a failed model, never as a cacheable answer.
+    if not slides:
+        raise ValueError("no_valid_slides")
 
     if len(slides) < slide_count:
-        fallback = _fallback_slides(topic, slide_count, lang)
+        fallback = _fallback_slides(topic, slide_count, lang, slide_modes=slide_modes)
         slides.extend(fallback[len(slides):slide_count])
 
     return slides[:slide_count]
 
 
-async def _generate_async(
-    prompt_topic: str,
-    slide_count: int,
-    template_type: int,
-    lang: str,
+def _slide_cache_key(prompt_topic: str, slide_count: int, template_type: int, lang: str) -> str:
+    raw = f"{prompt_topic.strip().lower()}|{slide_count}|{template_type}|{lang}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _slide_cache_get(key: str) -> list[SlideContent] | None:
+    cached = _slide_cache.get(key)
+    if cached is None:
+        return None
+    _slide_cache.move_to_end(key)
+    return list(cached)
+
+
+def _slide_cache_put(key: str, slides: list[SlideContent]) -> None:
+    _slide_cache[key] = tuple(slides)
+    _slide_cache.move_to_end(key)
+    while len(_slide_cache) > SLIDE_CACHE_MAX_ENTRIES:
+        _slide_cache.popitem(last=False)
+
+
+def _get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = get_openrouter_client().with_options(max_retries=0)
+    return _client
+
+
+class _JsonStreamTracker:
+
+    __slots__ = ("depth", "in_string", "escape", "started")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+
+    def feed(self, text: str) -> bool:
+        for char in text:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = self.started
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+
+async def _run_sized(size: int, func: Callable[..., _T], /, *args: Any, **kwargs: Any) -> _T:
+    if size > OFFLOAD_PARSE_CHARS:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def _with_retries(call: Callable[[], Awaitable[_T]]) -> _T:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + OPENROUTER_RETRY_BUDGET_SEC
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except (RateLimitError, APIConnectionError, InternalServerError):
+            delay = 0.5 * (2**attempt) + random.uniform(0, 0.25)
+            if attempt >= OPENROUTER_MAX_RETRIES or loop.time() + delay > deadline:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def _open_completion_stream(
+    client: AsyncOpenAI, model: str, prompt: str, started: asyncio.Event | None = None
+) -> Any:
+    # Each attempt takes its own request slot and gives it back on failure, so retry backoff never holds one.
+    # On success the caller owns the slot and must release it once the stream is done.
+    async def _attempt() -> Any:
+        await _request_semaphore.acquire()
+        try:
+            if started is not None:
+                started.set()
+            return await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": _SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.45,
+                stream=True,
+            )
+        except BaseException:
+            _request_semaphore.release()
+            raise
+
+    return await _with_retries(_attempt)
+
+
+async def _request_slides(
+    client: AsyncOpenAI,
+    model: str,
+    prompt: str,
     fallback_topic: str,
+    slide_count: int,
+    language_code: str,
+    slide_modes: list[str] | None = None,
+    started: asyncio.Event | None = None,
+    first_token: asyncio.Event | None = None,
 ) -> list[SlideContent]:
-    api_key = settings.openrouter_api_key.strip()
-    if not api_key:
-        logger.error("OPENROUTER_API_KEY is empty in .env")
-        return _fallback_slides(fallback_topic, slide_count, lang)
+    response = await _open_completion_stream(client, model, prompt, started)
+    tracker = _JsonStreamTracker()
+    parts: list[str] = []
+    received = 0
+    parsed: Any = None
+    try:
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token is not None:
+                first_token.set()
+            parts.append(delta)
+            received += len(delta)
+            if tracker.feed(delta):
+                try:
+                    parsed = await _run_sized(received, _extract_json, "".join(parts))
+                    break
+                except ValueError:
+                    tracker = _JsonStreamTracker()
+    finally:
+        try:
+            await response.close()
+        finally:
+            _request_semaphore.release()
+    if parsed is None:
+        parsed = await _run_sized(received, _extract_json, "".join(parts))
+    return await _run_sized(
+        received, _normalize_slides, fallback_topic, slide_count, parsed, language_code, slide_modes=slide_modes
+    )
 
-    language_code = _normalize_language_code(lang)
-    language_name = LANGUAGE_NAMES[language_code]
-    slide_modes = _build_slide_modes(slide_count)
-    mode_plan = _mode_lines_for_prompt(slide_modes)
 
-    prompt = (
+def _build_prompt(
+    prompt_topic: str,
+    slide_count: int,
+    template_type: int,
+    language_code: str,
+    slide_modes: list[str],
+) -> str:
+    return (
         "Create practical, engaging, audience-ready slide content for a presentation. Return strict JSON only.\n"
         f"Topic: {prompt_topic}\n"
         f"Slide count: {slide_count}\n"
         f"Template type: {template_type}\n\n"
-        f"Output language: {language_name} (code: {language_code})\n\n"
+        f"Output language: {LANGUAGE_NAMES[language_code]} (code: {language_code})\n\n"
         "Per-slide style plan (follow strictly so slides differ by style):\n"
-        f"{mode_plan}\n\n"
-        "Format:\n"
-        "{\n"
-        '  "slides": [\n'
-        '    {"title": "Clear title", "bullets": ["point 1", "point 2", "point 3", "point 4"]}\n'
-        "  ]\n"
-        "}\n\n"
-        "Rules:\n"
-        "- Exactly the requested slide count.\n"
-        "- Follow the per-slide style plan exactly by slide index.\n"
-        "- 3 to 4 meaningful bullets per slide.\n"
-        "- Each bullet: one complete sentence, approximately 80-180 characters.\n"
-        "- Slide 1: engaging opening with the main topic and why it matters now.\n"
-        "- Last slide: clear conclusions and next steps.\n"
-        "- Middle slides: key ideas with reasons, specific examples, and practical application.\n"
-        "- Write clearly and grammatically - no redundancy, every word counts.\n"
-        "- Explain deeply but in a lively way: simple wording, clear logic, and practical value.\n"
-        "- Include relevant examples, metrics, or practical tips where applicable.\n"
-        "- Make the slide visually balanced - not too crowded, easy to read.\n"
-        "- Keep the tone energetic and human; avoid overly formal, dry, or academic wording.\n"
-        "- Each slide must have unique, non-repetitive content.\n"
-        "- Avoid one-liners, generic statements, and obvious textbook facts.\n"
-        "- Prefer concrete, decision-useful information over abstract wording.\n"
-        "- Mix styles naturally across slides: facts, full analysis, interesting insights, and practical actions.\n"
-        "- If source material is present in the topic block, use it as the only factual basis.\n"
-        "- Do not invent facts that are missing in the provided source material.\n"
-        "- No markdown formatting, no code blocks, JSON only."
+        f"{_mode_lines_for_prompt(slide_modes)}"
     )
 
-    client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
-    timeout_sec = max(10, int(settings.openrouter_request_timeout_sec))
+
+async def _generate_async(
+    prompt_topic: str,
+    slide_count: int,
+    template_type: int,
+    language_code: str,
+    fallback_topic: str,
+) -> list[SlideContent]:
+    if not settings.openrouter_api_key:
+        logger.error("OPENROUTER_API_KEY is empty in .env")
+        return _fallback_slides(fallback_topic, slide_count, language_code)
+
+    cache_key = _slide_cache_key(prompt_topic, slide_count, template_type, language_code)
+    cached = _slide_cache_get(cache_key)
+    if cached is not None:
+        logger.debug("Slides served from cache")
+        return cached
+
+    inflight = _inflight_generations.get(cache_key)
+    if inflight is None or inflight.cancelling():
+        inflight = asyncio.create_task(
+            _generate_uncached(prompt_topic, slide_count, template_type, language_code, fallback_topic, cache_key)
+        )
+        _inflight_generations[cache_key] = inflight
+        inflight.add_done_callback(partial(_forget_inflight, cache_key))
+    else:
+        logger.debug("Joining an in-flight generation for the same deck")
+    _inflight_waiters[inflight] = _inflight_waiters.get(inflight, 0) + 1
+    try:
+        # Shielded: one caller giving up must not cancel the generation for the other waiters.
+        return list(await asyncio.shield(inflight))
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if current is not None and current.cancelling():
+            raise
+        logger.warning("Shared slide generation was cancelled; using fallback slides")
+        return _fallback_slides(fallback_topic, slide_count, language_code)
+    finally:
+        remaining = _inflight_waiters.pop(inflight) - 1
+        if remaining:
+            _inflight_waiters[inflight] = remaining
+        elif not inflight.done():
+            # Unregister before cancelling so a request arriving before the done callback starts afresh.
+            _forget_inflight(cache_key, inflight)
+            inflight.cancel()
+
+
+def _forget_inflight(cache_key: str, task: asyncio.Task[list[SlideContent]]) -> None:
+    if _inflight_generations.get(cache_key) is task:
+        del _inflight_generations[cache_key]
+
+
+async def _wait_tasks_or_events(
+    tasks: set[asyncio.Task[_T]],
+    events: list[asyncio.Event],
+    timeout: float | None,
+) -> set[asyncio.Task[_T]]:
+    watchers = [asyncio.create_task(event.wait()) for event in events]
+    try:
+        done, _ = await asyncio.wait([*tasks, *watchers], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+    return done & tasks
+
+
+async def _generate_uncached(
+    prompt_topic: str,
+    slide_count: int,
+    template_type: int,
+    language_code: str,
+    fallback_topic: str,
+    cache_key: str,
+) -> list[SlideContent]:
+    slide_modes = _build_slide_modes(slide_count)
+    prompt = _build_prompt(prompt_topic, slide_count, template_type, language_code, slide_modes)
+
+    client = _get_client()
     max_attempts = max(1, int(settings.openrouter_max_model_attempts))
     models = settings.openrouter_models[:max_attempts]
 
     last_error: Exception | None = None
-    for model in models:
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a senior presentation copywriter and analyst. "
-                            "Write content that is complete, concrete, and decision-useful. "
-                            "Do not produce shallow summaries: include reasoning, implications, and practical actions."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.45,
-                timeout=timeout_sec,
+    queued = iter(models)
+    tasks: dict[asyncio.Task[list[SlideContent]], str] = {}
+    started: dict[asyncio.Task[list[SlideContent]], asyncio.Event] = {}
+    first_tokens: dict[asyncio.Task[list[SlideContent]], asyncio.Event] = {}
+    pending: set[asyncio.Task[list[SlideContent]]] = set()
+
+    def _launch_next() -> bool:
+        model = next(queued, None)
+        if model is None:
+            return False
+        started_event = asyncio.Event()
+        first_token = asyncio.Event()
+        task = asyncio.create_task(
+            _request_slides(
+                client,
+                model,
+                prompt,
+                fallback_topic,
+                slide_count,
+                language_code,
+                slide_modes,
+                started_event,
+                first_token,
             )
-            content = response.choices[0].message.content or ""
-            parsed = _extract_json(content)
-            slides = _normalize_slides(fallback_topic, slide_count, parsed, language_code)
-            logger.info("Slides generated via model: %s", model)
-            return slides
-        except Exception as exc:
-            last_error = exc
-            logger.warning("OpenRouter model failed (%s): %s", model, exc)
+        )
+        tasks[task] = model
+        started[task] = started_event
+        first_tokens[task] = first_token
+        pending.add(task)
+        return True
+
+    has_more = _launch_next()
+    try:
+        while pending:
+            streaming = any(first_tokens[task].is_set() for task in pending)
+            if has_more and not streaming and len(pending) < settings.openrouter_parallel_fanout:
+                if not any(started[task].is_set() for task in pending):
+                    done = await _wait_tasks_or_events(pending, [started[task] for task in pending], None)
+                    if not done:
+                        continue
+                else:
+                    done = await _wait_tasks_or_events(
+                        pending, [first_tokens[task] for task in pending], MODEL_HEDGE_DELAY_SEC
+                    )
+                if not done:
+                    if not any(first_tokens[task].is_set() for task in pending):
+                        logger.info("OpenRouter model sent no token in time; starting the next one alongside it")
+                        has_more = _launch_next()
+                    continue
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            for task in [item for item in tasks if item in done]:
+                model = tasks[task]
+                exc = task.exception()
+                if exc is None:
+                    logger.debug("Slides generated via model: %s", model)
+                    slides = task.result()
+                    _slide_cache_put(cache_key, slides)
+                    return slides
+                last_error = exc
+                logger.warning("OpenRouter model failed (%s): %s", model, exc)
+                if has_more:
+                    has_more = _launch_next()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
 
     logger.error("All OpenRouter attempts failed: %s", last_error)
     return _fallback_slides(fallback_topic, slide_count, language_code, slide_modes=slide_modes)
 
 
+def _build_prompt_topic(topic: str, source_material: str | None) -> str:
+    if not source_material:
+        return topic
+    normalized_source = _collapse_ws_cap(source_material, MAX_SOURCE_MATERIAL_CHARS)
+    return (
+        f"{topic}\n\n"
+        "Source material (must be used as primary basis):\n"
+        f"{normalized_source}\n\n"
+        "Important: use this source as factual base for slide content."
+    )
+
+
 async def generate_slide_content(
     topic: str,
     slide_count: int,
@@ -593,25 +979,25 @@ async def generate_slide_content(
     effective_template_type = template_type if template_type is not None else presentation_type
     if effective_template_type is None:
         effective_template_type = 1
+    effective_lang = lang if lang in LANGUAGE_NAMES else "ru"
 
     try:
-        effective_lang = _normalize_language_code(lang)
-        prompt_topic = topic
-        if source_material:
-            normalized_source = re.sub(r"\s+", " ", source_material).strip()[:12000]
-            prompt_topic = (
-                f"{topic}\n\n"
-                "Source material (must be used as primary basis):\n"
-                f"{normalized_source}\n\n"
-                "Important: use this source as factual base for slide content."
-            )
-        return await _generate_async(
-            prompt_topic,
-            slide_count,
-            int(effective_template_type),
-            effective_lang,
-            topic,
+        prompt_topic = _build_prompt_topic(topic, source_material)
+        deadline_sec = max(10, int(settings.openrouter_request_timeout_sec)) * 2 + OPENROUTER_RETRY_BUDGET_SEC + 15
+        return await asyncio.wait_for(
+            _generate_async(
+                prompt_topic,
+                slide_count,
+                int(effective_template_type),
+                effective_lang,
+                topic,
+            ),
+            timeout=deadline_sec,
         )
+    except asyncio.TimeoutError:
+        logger.error("Slide generation exceeded its deadline; using fallback slides")
+        return _fallback_slides(topic, slide_count, effective_lang)
     except Exception as exc:
         logger.exception("Unexpected error while generating slides: %s", exc)
-        return _fallback_slides(topic, slide_count, _normalize_language_code(lang))
+        return _fallback_slides(topic, slide_count, effective_lang)
+
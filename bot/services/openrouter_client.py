@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from bot.config import load_settings
+
+logger = logging.getLogger(__name__)
+settings = load_settings()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_CONNECT_TIMEOUT_SEC = 5.0
+OPENROUTER_MAX_CONNECTIONS = 32
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = 16
+OPENROUTER_WARMUP_TIMEOUT_SEC = 5.0
+
+# One client per API key for the whole process, so every service shares the same warm connection pool.
+_clients: dict[str, AsyncOpenAI] = {}
+
+
+def openrouter_timeout(read_timeout_sec: float) -> httpx.Timeout:
+    # A dead endpoint should fail fast on connect; the long budget only applies to reading the response.
+    return httpx.Timeout(float(max(10, int(read_timeout_sec))), connect=OPENROUTER_CONNECT_TIMEOUT_SEC)
+
+
+def get_openrouter_client(api_key: str | None = None) -> AsyncOpenAI:
+    key = (api_key if api_key is not None else settings.openrouter_api_key).strip()
+    client = _clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=key,
+            timeout=openrouter_timeout(settings.openrouter_request_timeout_sec),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENROUTER_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            ),
+        )
+        _clients[key] = client
+    return client
+
+
+async def warmup_openrouter_client() -> None:
+    # A cheap GET /models at startup pays DNS + TCP + TLS up front, so the first user request reuses a warm
+    # connection. Failures only mean the first request connects itself, so they are logged and ignored.
+    if not settings.openrouter_api_key.strip():
+        return
+    client = get_openrouter_client().with_options(max_retries=0)
+    try:
+        await asyncio.wait_for(client.models.list(), timeout=OPENROUTER_WARMUP_TIMEOUT_SEC)
+    except Exception as exc:
+        logger.warning("OpenRouter warmup failed: %r", exc)
+    else:
+        logger.info("OpenRouter connection pool warmed up")
+
+
+async def close_openrouter_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
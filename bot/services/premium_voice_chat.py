@@ -4,19 +4,26 @@ import asyncio
 import logging
 import os
 import shutil
-import tempfile
+import subprocess
 from functools import lru_cache
 from pathlib import Path
 
-from openai import AsyncOpenAI
-from pydub import AudioSegment
 import speech_recognition as sr
 
 from bot.config import load_settings
+from bot.i18n import LANGUAGE_NAMES
+from bot.services.openrouter_client import get_openrouter_client
 
 logger = logging.getLogger(__name__)
 settings = load_settings()
 
+VOICE_SAMPLE_RATE = 16000
+VOICE_SAMPLE_WIDTH = 2
+CHAT_HEDGE_DELAY_SEC = 10.0
+
+# Each transcription runs an ffmpeg process plus a worker thread, so cap how many run at once.
+_transcription_semaphore = asyncio.Semaphore(settings.voice_transcription_concurrency)
+
 
 def _effective_lang(lang: str | None) -> str | None:
     mapping = {
@@ -51,38 +58,54 @@ def _resolve_ffmpeg_binary() -> str | None:
     return None
 
 
-def _decode_ogg_to_wav(ogg_path: Path, wav_path: Path) -> None:
+def _decode_ogg_to_pcm(ogg_path: Path) -> bytes:
     ffmpeg_binary = _resolve_ffmpeg_binary()
     if not ffmpeg_binary:
         raise RuntimeError("ffmpeg_not_found")
 
-    AudioSegment.converter = ffmpeg_binary
-    AudioSegment.ffmpeg = ffmpeg_binary
-
-    audio = AudioSegment.from_file(str(ogg_path), format="ogg")
-    if len(audio) <= 0:
+    # Let ffmpeg resample straight to what SpeechRecognition wants (mono, 16 kHz, 16-bit PCM) and read
+    # the raw samples from its stdout, instead of round-tripping through an intermediate AudioSegment.
+    completed = subprocess.run(
+        [
+            ffmpeg_binary,
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-i",
+            str(ogg_path),
+            "-f",
+            "s16le",
+            "-acodec",
+            "pcm_s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(VOICE_SAMPLE_RATE),
+            "-",
+        ],
+        capture_output=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg_decode_failed: {completed.stderr.decode(errors='replace').strip()[:300]}")
+    if not completed.stdout:
         raise ValueError("empty_audio")
-
-    # Normalize for SpeechRecognition: mono, 16 kHz, 16-bit PCM.
-    normalized = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-    normalized.export(str(wav_path), format="wav")
+    return completed.stdout
 
 
 def _transcribe_sync(voice_file_path: Path, lang: str | None = None) -> str:
     recognizer = sr.Recognizer()
-    with tempfile.TemporaryDirectory(prefix="voice_wav_") as temp_dir:
-        wav_path = Path(temp_dir) / "voice.wav"
-        _decode_ogg_to_wav(voice_file_path, wav_path)
-        with sr.AudioFile(str(wav_path)) as source:
-            audio = recognizer.record(source)
-        text = recognizer.recognize_google(audio, language=_effective_lang(lang)).strip()
-        if not text:
-            raise ValueError("empty_transcription")
-        return text
+    # The decoded samples are already in the recognizer's format, so skip the WAV encode/parse round-trip.
+    audio = sr.AudioData(_decode_ogg_to_pcm(voice_file_path), VOICE_SAMPLE_RATE, VOICE_SAMPLE_WIDTH)
+    text = recognizer.recognize_google(audio, language=_effective_lang(lang)).strip()
+    if not text:
+        raise ValueError("empty_transcription")
+    return text
 
 
 async def transcribe_voice_file(voice_file_path: Path, lang: str | None = None) -> str:
-    return await asyncio.to_thread(_transcribe_sync, voice_file_path, lang)
+    async with _transcription_semaphore:
+        return await asyncio.to_thread(_transcribe_sync, voice_file_path, lang)
 
 
 async def ask_openrouter_from_text(user_text: str, lang: str = "ru") -> str:
@@ -90,39 +113,79 @@ async def ask_openrouter_from_text(user_text: str, lang: str = "ru") -> str:
     if not api_key:
         raise ValueError("missing_openrouter_api_key")
 
-    timeout_sec = max(10, int(settings.openrouter_request_timeout_sec))
     max_attempts = max(1, int(settings.openrouter_max_model_attempts))
     models = settings.openrouter_models[:max_attempts]
     if not models:
         raise ValueError("missing_openrouter_models")
 
-    language_name = {"ru": "Russian", "en": "English", "uz": "Uzbek"}.get(lang, "Russian")
-    client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
-
+    language_name = LANGUAGE_NAMES.get(lang, LANGUAGE_NAMES["ru"])
+    client = get_openrouter_client(api_key)
+
+    async def _ask(model: str) -> str:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a precise, practical assistant. "
+                        f"Answer in {language_name} unless the user asks another language."
+                    ),
+                },
+                {"role": "user", "content": user_text[:12000]},
+            ],
+            temperature=0.3,
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    # Hedged start, as in slide generation: the first model runs alone and the next one only joins when it fails,
+    # answers empty, or is still silent after CHAT_HEDGE_DELAY_SEC.
+    fanout = max(1, int(settings.openrouter_parallel_fanout))
+    queued = iter(models)
+    tasks: dict[asyncio.Task[str], str] = {}
+    pending: set[asyncio.Task[str]] = set()
     last_error: Exception | None = None
-    for model in models:
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a precise, practical assistant. "
-                            f"Answer in {language_name} unless the user asks another language."
-                        ),
-                    },
-                    {"role": "user", "content": user_text[:12000]},
-                ],
-                temperature=0.3,
-                timeout=timeout_sec,
+
+    def _launch_next() -> bool:
+        model = next(queued, None)
+        if model is None:
+            return False
+        task = asyncio.create_task(_ask(model))
+        tasks[task] = model
+        pending.add(task)
+        return True
+
+    has_more = _launch_next()
+    try:
+        while pending:
+            hedge = has_more and len(pending) < fanout
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=CHAT_HEDGE_DELAY_SEC if hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
             )
-            answer = (response.choices[0].message.content or "").strip()
-            if answer:
-                return answer
-        except Exception as exc:
-            last_error = exc
-            logger.warning("OpenRouter chat model failed (%s): %s", model, exc)
+            if not done:
+                logger.info("OpenRouter chat model is slow; starting the next one alongside it")
+                has_more = _launch_next()
+                continue
+            pending.difference_update(done)
+            for task in [item for item in tasks if item in done]:
+                exc = task.exception()
+                if exc is not None:
+                    last_error = exc
+                    logger.warning("OpenRouter chat model failed (%s): %s", tasks[task], exc)
+                else:
+                    answer = task.result()
+                    if answer:
+                        return answer
+                if has_more:
+                    has_more = _launch_next()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
 
     if last_error is not None:
         raise last_error
@@ -1,19 +1,29 @@
 ﻿from __future__ import annotations
 
 import asyncio
+import hashlib
+import io
+import os
 import random
 import re
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from xml.sax.saxutils import quoteattr
 
 from PIL import Image, ImageStat
 from pptx import Presentation
 from pptx.dml.color import RGBColor
 from pptx.enum.shapes import MSO_AUTO_SHAPE_TYPE
 from pptx.enum.text import MSO_ANCHOR, MSO_AUTO_SIZE, PP_ALIGN
-from pptx.util import Pt
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+from pptx.util import Length, Pt
 
+from bot.config import load_settings
 from bot.services.ai_text_presentation_generator import (
     SlideContent,
     resolve_pdf_template_asset,
@@ -63,10 +73,17 @@ THEMES = [
 ]
 
 PDF_RENDER_SCALE = 1.8
+PDF_PAGE_CACHE_DIR = load_settings().pdf_page_cache_dir
+PDF_PAGE_CACHE_MAX_ENTRIES = 32
+IMAGE_ANALYSIS_MAX_WORKERS = 4
+ZONE_SCORING_MAX_SIDE = 384
+
+_SAFE_NAME_RE = re.compile(r"[^\w\-]+", re.UNICODE)
+_LAYOUT_RNG = random.Random()
 
 
 def _safe_filename(source: str) -> str:
-    cleaned = re.sub(r"[^\w\-]+", "_", source, flags=re.UNICODE).strip("_")
+    cleaned = _SAFE_NAME_RE.sub("_", source).strip("_")
     return cleaned[:40] or "presentation"
 
 
@@ -74,12 +91,27 @@ def _parse_hex_color(color_hex: str) -> RGBColor:
     value = color_hex.strip().lstrip("#")
     if len(value) != 6:
         raise ValueError("Некорректный цвет")
-    return RGBColor(int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16))
+    packed = int(value, 16)
+    return RGBColor((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
 
 
 def _rgb_from_hex(color_hex: str) -> RGBColor:
-    value = color_hex.lstrip("#")
-    return RGBColor(int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16))
+    packed = int(color_hex.lstrip("#"), 16)
+    return RGBColor((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+
+
+@lru_cache(maxsize=None)
+def _pt(points: float) -> Length:
+    return Pt(points)
+
+
+@lru_cache(maxsize=64)
+def _body_list_style_xml(font_name: str, font_size: int, color_hex: str) -> str:
+    return (
+        f'<a:lstStyle {nsdecls("a")}><a:lvl1pPr algn="l"><a:spcAft><a:spcPts val="500"/></a:spcAft>'
+        f'<a:defRPr sz="{font_size * 100}"><a:solidFill><a:srgbClr val="{color_hex}"/></a:solidFill>'
+        f"<a:latin typeface={quoteattr(font_name)}/></a:defRPr></a:lvl1pPr></a:lstStyle>"
+    )
 
 
 def _estimate_body_font_size(slide: SlideContent) -> int:
@@ -111,11 +143,29 @@ def _fit_inside(width: int, height: int, max_width: int, max_height: int) -> tup
     return max(1, int(width * ratio)), max(1, int(height * ratio))
 
 
+def _read_image_size(image_path: Path) -> tuple[int, int] | None:
+    try:
+        mtime_ns = image_path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return _image_size(str(image_path), mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _image_size(image_path: str, mtime_ns: int) -> tuple[int, int] | None:
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
 def _add_background_image_cover(
     slide,
     image_path: Path,
     slide_width: int,
     slide_height: int,
+    image_size: tuple[int, int] | None = None,
 ) -> None:
     # Render full-bleed background while preserving original proportions.
     picture = slide.shapes.add_picture(
@@ -125,11 +175,11 @@ def _add_background_image_cover(
         width=slide_width,
         height=slide_height,
     )
-    try:
-        with Image.open(image_path) as img:
-            img_width, img_height = img.size
-    except Exception:
+    if image_size is None:
+        image_size = _read_image_size(image_path)
+    if image_size is None:
         return
+    img_width, img_height = image_size
 
     if img_width <= 0 or img_height <= 0 or slide_width <= 0 or slide_height <= 0:
         return
@@ -149,14 +199,14 @@ def _add_background_image_cover(
         picture.crop_bottom = crop_each
 
 
-def _pick_image_layout(image_path: Path) -> str:
+def _pick_image_layout(image_path: Path, image_size: tuple[int, int] | None = None) -> str:
     layouts = ("left", "right", "top", "bottom")
-    rng = random.SystemRandom()
-    try:
-        with Image.open(image_path) as img:
-            img_width, img_height = img.size
-    except Exception:
+    rng = _LAYOUT_RNG
+    if image_size is None:
+        image_size = _read_image_size(image_path)
+    if image_size is None:
         return rng.choice(layouts)
+    img_width, img_height = image_size
 
     if img_width <= 0 or img_height <= 0:
         return rng.choice(layouts)
@@ -218,17 +268,18 @@ def _add_user_image(
     image_zone: tuple[float, float, float, float],
     slide_width: int,
     slide_height: int,
+    image_size: tuple[int, int] | None = None,
 ) -> None:
     if not image_path.exists():
         return
     zone_left, zone_top, zone_width, zone_height = _ratio_to_emu(image_zone, slide_width, slide_height)
     if zone_width <= 0 or zone_height <= 0:
         return
-    try:
-        with Image.open(image_path) as img:
-            image_width, image_height = img.size
-    except Exception:
+    if image_size is None:
+        image_size = _read_image_size(image_path)
+    if image_size is None:
         return
+    image_width, image_height = image_size
 
     picture = slide.shapes.add_picture(
         str(image_path),
@@ -267,7 +318,8 @@ def _hex_to_rgb(color_hex: str) -> tuple[int, int, int]:
     value = color_hex.strip().lstrip("#")
     if len(value) != 6:
         return 0, 0, 0
-    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+    packed = int(value, 16)
+    return (packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF
 
 
 def _contrast_ratio(text_rgb: tuple[int, int, int], bg_luma: float) -> float:
@@ -278,8 +330,8 @@ def _contrast_ratio(text_rgb: tuple[int, int, int], bg_luma: float) -> float:
     return lighter / darker
 
 
-def _score_candidate(image: Image.Image, box: tuple[float, float, float, float], text_rgb: tuple[int, int, int]) -> float:
-    width, height = image.size
+def _score_candidate(gray: Image.Image, box: tuple[float, float, float, float], text_rgb: tuple[int, int, int]) -> float:
+    width, height = gray.size
     left = int(width * box[0])
     top = int(height * box[1])
     right = int(width * (box[0] + box[2]))
@@ -288,8 +340,7 @@ def _score_candidate(image: Image.Image, box: tuple[float, float, float, float],
     if right <= left or bottom <= top:
         return float("-inf")
 
-    cropped = image.crop((left, top, right, bottom)).convert("L")
-    stat = ImageStat.Stat(cropped)
+    stat = ImageStat.Stat(gray.crop((left, top, right, bottom)))
     mean = stat.mean[0] if stat.mean else 128.0
     stddev = stat.stddev[0] if stat.stddev else 0.0
     contrast = _contrast_ratio(text_rgb, mean)
@@ -301,15 +352,30 @@ def _score_candidate(image: Image.Image, box: tuple[float, float, float, float],
 def _detect_text_zones_from_background(
     image_path: Path,
     text_color_hex: str,
+) -> tuple[tuple[float, float, float, float], tuple[float, float, float, float]]:
+    try:
+        mtime_ns = image_path.stat().st_mtime_ns
+    except OSError:
+        return TITLE_ZONE, BODY_ZONE
+    return _detect_text_zones_cached(str(image_path), mtime_ns, text_color_hex)
+
+
+@lru_cache(maxsize=256)
+def _detect_text_zones_cached(
+    image_path: str,
+    mtime_ns: int,
+    text_color_hex: str,
 ) -> tuple[tuple[float, float, float, float], tuple[float, float, float, float]]:
     try:
         with Image.open(image_path) as image:
+            image.thumbnail((ZONE_SCORING_MAX_SIDE, ZONE_SCORING_MAX_SIDE), Image.Resampling.BILINEAR)
+            gray = image.convert("L")
             rgb = _hex_to_rgb(text_color_hex)
-            best_title = max(TITLE_ZONE_CANDIDATES, key=lambda candidate: _score_candidate(image, candidate, rgb))
+            best_title = max(TITLE_ZONE_CANDIDATES, key=lambda candidate: _score_candidate(gray, candidate, rgb))
             body_candidates = [candidate for candidate in BODY_ZONE_CANDIDATES if candidate[1] >= best_title[1] + best_title[3] - 0.01]
             if not body_candidates:
                 body_candidates = list(BODY_ZONE_CANDIDATES)
-            best_body = max(body_candidates, key=lambda candidate: _score_candidate(image, candidate, rgb))
+            best_body = max(body_candidates, key=lambda candidate: _score_candidate(gray, candidate, rgb))
             return best_title, best_body
     except Exception:
         return TITLE_ZONE, BODY_ZONE
@@ -373,30 +439,93 @@ def _add_background(slide, slide_width: int, slide_height: int, index: int) -> t
     content_card.fill.fore_color.rgb = card_color
     content_card.line.fill.solid()
     content_card.line.fill.fore_color.rgb = accent_color
-    content_card.line.width = Pt(1.6)
+    content_card.line.width = _pt(1.6)
 
     return header_color, accent_color
 
 
-def _render_pdf_pages_to_png(pdf_path: Path) -> list[Path]:
-    if fitz is None:
-        raise RuntimeError("Для PDF-шаблона нужен пакет PyMuPDF (pip install pymupdf).")
-
-    output: list[Path] = []
+def _render_pdf_pages_into(pdf_path: Path, render_dir: Path) -> None:
     document = fitz.open(str(pdf_path))
     matrix = fitz.Matrix(PDF_RENDER_SCALE, PDF_RENDER_SCALE)
     try:
         # For ready-made PDF templates, skip the first page/background consistently.
         start_page = 1 if document.page_count > 1 else 0
         for page_index in range(start_page, document.page_count):
-            page = document.load_page(page_index)
-            pixmap = page.get_pixmap(matrix=matrix, alpha=False)
-            image_path = Path(tempfile.mkstemp(prefix="pdf_template_", suffix=".png")[1])
-            pixmap.save(str(image_path))
-            output.append(image_path)
+            pixmap = document.load_page(page_index).get_pixmap(matrix=matrix, alpha=False)
+            pixmap.save(str(render_dir / f"page_{page_index}.png"))
     finally:
         document.close()
-    return output
+
+
+def _evict_pdf_page_cache(keep: Path) -> None:
+    entries: list[tuple[float, Path]] = []
+    for entry in PDF_PAGE_CACHE_DIR.iterdir():
+        if entry == keep or entry.name.startswith(".") or not entry.is_dir():
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, entry))
+        except OSError:
+            continue
+    excess = len(entries) + 1 - PDF_PAGE_CACHE_MAX_ENTRIES
+    if excess > 0:
+        for _, entry in sorted(entries)[:excess]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _render_pdf_pages_to_png(pdf_path: Path) -> list[Path]:
+    if fitz is None:
+        raise RuntimeError("Для PDF-шаблона нужен пакет PyMuPDF (pip install pymupdf).")
+
+    source = str(pdf_path.resolve())
+    prefix = hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
+    render_dir = PDF_PAGE_CACHE_DIR / f"{prefix}_{pdf_path.stat().st_mtime_ns}"
+    if not render_dir.is_dir():
+        PDF_PAGE_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        partial_dir = Path(tempfile.mkdtemp(prefix=".partial_", dir=PDF_PAGE_CACHE_DIR))
+        try:
+            _render_pdf_pages_into(pdf_path, partial_dir)
+            # Publishes a complete directory atomically; if a concurrent build got there first, keep its copy.
+            os.rename(partial_dir, render_dir)
+        except OSError:
+            if not render_dir.is_dir():
+                raise
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+        for stale_dir in PDF_PAGE_CACHE_DIR.glob(f"{prefix}_*"):
+            if stale_dir != render_dir:
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        _evict_pdf_page_cache(keep=render_dir)
+    else:
+        # Refresh LRU order for _evict_pdf_page_cache.
+        try:
+            os.utime(render_dir)
+        except OSError:
+            pass
+
+    pages = [entry for entry in render_dir.iterdir() if entry.name.startswith("page_") and entry.suffix == ".png"]
+    return sorted(pages, key=lambda page: int(page.stem.removeprefix("page_")))
+
+
+def _analyze_images(
+    backgrounds: list[Path],
+    user_images: list[Path],
+    font_color: str,
+) -> tuple[
+    dict[Path, tuple[tuple[float, float, float, float], tuple[float, float, float, float]]],
+    dict[Path, tuple[int, int] | None],
+]:
+    size_paths = list(dict.fromkeys([*backgrounds, *user_images]))
+    workers = min(IMAGE_ANALYSIS_MAX_WORKERS, len(backgrounds) + len(size_paths))
+    if workers <= 1:
+        zones = [_detect_text_zones_from_background(path, font_color) for path in backgrounds]
+        sizes = [_read_image_size(path) for path in size_paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            zone_futures = [pool.submit(_detect_text_zones_from_background, path, font_color) for path in backgrounds]
+            size_futures = [pool.submit(_read_image_size, path) for path in size_paths]
+            zones = [future.result() for future in zone_futures]
+            sizes = [future.result() for future in size_futures]
+    return dict(zip(backgrounds, zones)), dict(zip(size_paths, sizes))
 
 
 def _build_presentation_sync(
@@ -411,60 +540,67 @@ def _build_presentation_sync(
 ) -> Path:
     presentation = Presentation()
     blank_layout = presentation.slide_layouts[6]
+    slide_width = presentation.slide_width
+    slide_height = presentation.slide_height
     color = _parse_hex_color(font_color)
-    temp_images: list[Path] = []
     pdf_pages_cache: dict[str, list[Path]] = {}
-    zones_cache: dict[str, tuple[tuple[float, float, float, float], tuple[float, float, float, float]]] = {}
     prepared_user_images: list[Path] = []
     for image_path in user_image_paths or []:
         candidate = Path(image_path)
         if candidate.exists():
             prepared_user_images.append(candidate)
 
+    slide_template_types = [
+        template_types[index] if index < len(template_types) else (template_types[0] if template_types else 1)
+        for index in range(len(slides))
+    ]
+    pdf_assets = {template_type: resolve_pdf_template_asset(template_type) for template_type in set(slide_template_types)}
+    static_assets = {
+        template_type: resolve_template_asset(template_type)
+        for template_type, pdf_template_path in pdf_assets.items()
+        if pdf_template_path is None
+    }
+    slide_backgrounds: list[Path | None] = []
+    for index, template_type in enumerate(slide_template_types):
+        pdf_template_path = pdf_assets[template_type]
+        if pdf_template_path is None:
+            slide_backgrounds.append(static_assets[template_type])
+            continue
+        cache_key = str(pdf_template_path.resolve())
+        pdf_pages = pdf_pages_cache.get(cache_key)
+        if pdf_pages is None:
+            pdf_pages = _render_pdf_pages_to_png(pdf_template_path)
+            pdf_pages_cache[cache_key] = pdf_pages
+        if not pdf_pages:
+            raise RuntimeError(f"PDF шаблон пустой: {pdf_template_path}")
+        slide_backgrounds.append(pdf_pages[index % len(pdf_pages)])
+
+    zones_by_background, image_sizes = _analyze_images(
+        list(dict.fromkeys(background for background in slide_backgrounds if background is not None)),
+        prepared_user_images,
+        font_color,
+    )
+
+    def _cached_image_size(image_path: Path) -> tuple[int, int] | None:
+        if image_path not in image_sizes:
+            image_sizes[image_path] = _read_image_size(image_path)
+        return image_sizes[image_path]
+
+    # python-pptx is not thread-safe, so slides are built sequentially.
     for index, slide_content in enumerate(slides):
-        template_type = template_types[index] if index < len(template_types) else (template_types[0] if template_types else 1)
         slide = presentation.slides.add_slide(blank_layout)
-
-        pdf_template_path = resolve_pdf_template_asset(template_type)
-        static_image_asset = resolve_template_asset(template_type)
-
-        if pdf_template_path is not None:
-            cache_key = str(pdf_template_path.resolve())
-            pdf_pages = pdf_pages_cache.get(cache_key)
-            if pdf_pages is None:
-                pdf_pages = _render_pdf_pages_to_png(pdf_template_path)
-                pdf_pages_cache[cache_key] = pdf_pages
-                temp_images.extend(pdf_pages)
-            if not pdf_pages:
-                raise RuntimeError(f"PDF шаблон пустой: {pdf_template_path}")
-            bg_image = pdf_pages[index % len(pdf_pages)]
+        background_path = slide_backgrounds[index]
+        if background_path is not None:
             _add_background_image_cover(
                 slide=slide,
-                image_path=bg_image,
-                slide_width=presentation.slide_width,
-                slide_height=presentation.slide_height,
+                image_path=background_path,
+                slide_width=slide_width,
+                slide_height=slide_height,
+                image_size=_cached_image_size(background_path),
             )
-            zone_key = str(bg_image.resolve())
-        elif static_image_asset is not None:
-            _add_background_image_cover(
-                slide=slide,
-                image_path=static_image_asset,
-                slide_width=presentation.slide_width,
-                slide_height=presentation.slide_height,
-            )
-            zone_key = str(static_image_asset.resolve())
-        else:
-            _add_background(slide, presentation.slide_width, presentation.slide_height, index)
-            zone_key = ""
-
-        if zone_key:
-            zones = zones_cache.get(zone_key)
-            if zones is None:
-                background_path = Path(zone_key)
-                zones = _detect_text_zones_from_background(background_path, font_color)
-                zones_cache[zone_key] = zones
-            title_zone, body_zone = zones
+            title_zone, body_zone = zones_by_background[background_path]
         else:
+            _add_background(slide, slide_width, slide_height, index)
             title_zone, body_zone = TITLE_ZONE, BODY_ZONE
 
         has_title = index == 0
@@ -472,14 +608,12 @@ def _build_presentation_sync(
         if has_title:
             title_zone = FIRST_SLIDE_TITLE_ZONE
         slide_image = _select_slide_image(prepared_user_images, index)
-        if slide_image is None and zone_key:
-            fallback_image = Path(zone_key)
-            if fallback_image.exists():
-                slide_image = fallback_image
+        if slide_image is None and background_path is not None and background_path.exists():
+            slide_image = background_path
         body_zone_for_text = body_zone if has_title else BODY_ZONE_NO_TITLE
         image_zone: tuple[float, float, float, float] | None = None
         if slide_image is not None:
-            preferred_layout = _pick_image_layout(slide_image)
+            preferred_layout = _pick_image_layout(slide_image, _cached_image_size(slide_image))
             body_zone_for_text, image_zone = _adjust_zones_for_single_image(
                 has_title=has_title,
                 image_layout=preferred_layout,
@@ -488,8 +622,8 @@ def _build_presentation_sync(
         if has_title:
             title_left, title_top, title_width, title_height = _ratio_to_emu(
                 title_zone,
-                presentation.slide_width,
-                presentation.slide_height,
+                slide_width,
+                slide_height,
             )
             title_box = slide.shapes.add_textbox(
                 left=title_left,
@@ -509,15 +643,15 @@ def _build_presentation_sync(
             title_paragraph.text = title_text
             title_paragraph.font.bold = True
             title_paragraph.font.name = font_name
-            title_paragraph.font.size = Pt(_estimate_title_font_size(title_text))
+            title_paragraph.font.size = _pt(_estimate_title_font_size(title_text))
             title_paragraph.font.color.rgb = color
             title_paragraph.alignment = PP_ALIGN.CENTER
-            title_paragraph.space_after = Pt(2)
+            title_paragraph.space_after = _pt(2)
 
         body_left, body_top, body_width, body_height = _ratio_to_emu(
             body_zone_for_text,
-            presentation.slide_width,
-            presentation.slide_height,
+            slide_width,
+            slide_height,
         )
         body_box = slide.shapes.add_textbox(
             left=body_left,
@@ -534,25 +668,24 @@ def _build_presentation_sync(
         body_frame.vertical_anchor = MSO_ANCHOR.TOP
         body_frame.word_wrap = True
         body_frame.auto_size = MSO_AUTO_SIZE.TEXT_TO_FIT_SHAPE
-        body_font_size = _estimate_body_font_size(slide_content)
+        body_tx = body_frame._txBody
+        body_tx.replace(
+            body_tx.find(qn("a:lstStyle")),
+            parse_xml(_body_list_style_xml(font_name, _estimate_body_font_size(slide_content), str(color))),
+        )
 
         for bullet_index, bullet in enumerate(slide_content.bullets):
             paragraph = body_frame.paragraphs[0] if bullet_index == 0 else body_frame.add_paragraph()
             paragraph.text = f"• {bullet}"
-            paragraph.level = 0
-            paragraph.font.name = font_name
-            paragraph.font.size = Pt(body_font_size)
-            paragraph.font.color.rgb = color
-            paragraph.alignment = PP_ALIGN.LEFT
-            paragraph.space_after = Pt(5)
 
         if slide_image is not None and image_zone is not None:
             _add_user_image(
                 slide=slide,
                 image_path=slide_image,
                 image_zone=image_zone,
-                slide_width=presentation.slide_width,
-                slide_height=presentation.slide_height,
+                slide_width=slide_width,
+                slide_height=slide_height,
+                image_size=_cached_image_size(slide_image),
             )
 
     if creator_names:
@@ -560,16 +693,16 @@ def _build_presentation_sync(
         final_slide = presentation.slides.add_slide(blank_layout)
         _add_background(
             final_slide,
-            presentation.slide_width,
-            presentation.slide_height,
+            slide_width,
+            slide_height,
             creator_index,
         )
 
         names_box = final_slide.shapes.add_textbox(
-            left=int(presentation.slide_width * 0.10),
-            top=int(presentation.slide_height * 0.34),
-            width=int(presentation.slide_width * 0.80),
-            height=int(presentation.slide_height * 0.36),
+            left=int(slide_width * 0.10),
+            top=int(slide_height * 0.34),
+            width=int(slide_width * 0.80),
+            height=int(slide_height * 0.36),
         )
         names_frame = names_box.text_frame
         names_frame.clear()
@@ -580,19 +713,19 @@ def _build_presentation_sync(
             paragraph.text = raw_name
             paragraph.level = 0
             paragraph.font.name = font_name
-            paragraph.font.size = Pt(26)
+            paragraph.font.size = _pt(26)
             paragraph.font.color.rgb = color
             paragraph.alignment = PP_ALIGN.CENTER
 
     out_dir = Path(tempfile.mkdtemp(prefix="tg_presentation_"))
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_path = out_dir / f"{_safe_filename(topic)}_{stamp}.pptx"
-    presentation.save(output_path)
-    for temp_image in temp_images:
-        try:
-            temp_image.unlink(missing_ok=True)
-        except Exception:
-            pass
+    # os.replace so readers never see a half-written file.
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    partial_path = output_path.with_suffix(".pptx.tmp")
+    partial_path.write_bytes(buffer.getbuffer())
+    os.replace(partial_path, output_path)
     return output_path
 
 
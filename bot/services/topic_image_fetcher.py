@@ -10,7 +10,8 @@ from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
 from PIL import Image
-from openai import AsyncOpenAI
+
+from bot.services.openrouter_client import get_openrouter_client, openrouter_timeout
 
 PEXELS_SEARCH_URL = "https://api.pexels.com/v1/search"
 HTTP_HEADERS = {
@@ -141,8 +142,8 @@ async def translate_topic_to_russian(
     if not openrouter_api_key.strip() or not openrouter_models:
         return normalized_topic
 
-    client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=openrouter_api_key.strip())
-    timeout_sec = max(10, int(request_timeout_sec))
+    client = get_openrouter_client(openrouter_api_key)
+    timeout = openrouter_timeout(request_timeout_sec)
     models = openrouter_models[: max(1, int(max_model_attempts))]
 
     for model in models:
@@ -160,7 +161,7 @@ async def translate_topic_to_russian(
                     {"role": "user", "content": normalized_topic[:3000]},
                 ],
                 temperature=0.0,
-                timeout=timeout_sec,
+                timeout=timeout,
             )
             translated = (response.choices[0].message.content or "").strip()
             if translated:
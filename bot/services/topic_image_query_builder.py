@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 import re
 
-from openai import AsyncOpenAI
+from bot.services.openrouter_client import get_openrouter_client, openrouter_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -32,8 +32,8 @@ async def build_photo_search_query_openrouter(
     if not openrouter_api_key.strip() or not openrouter_models:
         return raw_topic
 
-    client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=openrouter_api_key.strip())
-    timeout_sec = max(10, int(request_timeout_sec))
+    client = get_openrouter_client(openrouter_api_key)
+    timeout = openrouter_timeout(request_timeout_sec)
     models = openrouter_models[: max(1, int(max_model_attempts))]
 
     prompt = (
@@ -63,7 +63,7 @@ async def build_photo_search_query_openrouter(
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.15,
-                timeout=timeout_sec,
+                timeout=timeout,
             )
             candidate = _sanitize_query(response.choices[0].message.content or "")
             if candidate: